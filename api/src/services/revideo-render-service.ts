@@ -91,11 +91,26 @@ async function renderWithModal(
 		throw new Error(`Modal render failed: ${response.status} ${response.statusText}`);
 	}
 
+	// Modal streams the MP4 body directly when S3 is not configured
+	const contentType = response.headers.get("content-type") ?? "";
+	if (contentType.startsWith("video/")) {
+		const outputPath = path.join(os.tmpdir(), `render-${jobId}.mp4`);
+		await fs.promises.writeFile(outputPath, Buffer.from(await response.arrayBuffer()));
+
+		renderLog.info("Modal render completed (streamed)", { outputPath });
+
+		if (onProgress) {
+			onProgress(100);
+		}
+
+		return outputPath;
+	}
+
 	const result = (await response.json()) as {
 		success: boolean;
-		videoBase64?: string;
+		videoUrl?: string;
+		key?: string;
 		error?: string;
-		size?: number;
 	};
 
 	if (!result.success) {
@@ -103,12 +118,18 @@ async function renderWithModal(
 		throw new Error(`Modal render failed: ${result.error}`);
 	}
 
-	if (!result.videoBase64) {
-		throw new Error("Modal render returned no video data");
+	if (!result.videoUrl) {
+		throw new Error("Modal render returned no video URL");
 	}
 
-	// Decode base64 and save to temp file
-	const videoBuffer = Buffer.from(result.videoBase64, "base64");
+	// Download the MP4 from the presigned URL and save to temp file
+	const videoResponse = await fetch(result.videoUrl);
+	if (!videoResponse.ok) {
+		throw new Error(
+			`Failed to download rendered video: ${videoResponse.status} ${videoResponse.statusText}`,
+		);
+	}
+	const videoBuffer = Buffer.from(await videoResponse.arrayBuffer());
 	const outputPath = path.join(os.tmpdir(), `render-${jobId}.mp4`);
 
 	await fs.promises.writeFile(outputPath, videoBuffer);
@@ -1,10 +1,38 @@
 import modal
 import subprocess
-import json
 import os
+import uuid
 
 app = modal.App("unscroll-video-render")
 
+# Same bucket the API uses for render assets (see api/src/services/storage-service.ts)
+ASSETS_BUCKET = os.environ.get("ASSETS_BUCKET", "unscroll-assets")
+AWS_REGION = os.environ.get("AWS_REGION", "us-east-2")
+PRESIGNED_URL_EXPIRY_SECONDS = 3600
+
+# Must exist in the Modal workspace or deploy fails at lookup - create an
+# EMPTY secret named "aws-secret" when not using S3 (see infra/DEPLOY.md).
+aws_secret = modal.Secret.from_name("aws-secret")
+
+# Fallback delivery path when the aws-secret is empty (no AWS credentials):
+# renders land on a shared volume and the endpoint streams them with
+# FileResponse.
+output_vol = modal.Volume.from_name("render-outputs", create_if_missing=True)
+SHARED_DIR = "/shared"
+
+# Warm GPU shader / V8 code caches survive across containers here, so cold
+# starts skip tens of seconds of WebGL shader compilation on first frame.
+# The volume only ever holds a seed snapshot; Chromium runs against a
+# container-local copy (see Renderer.start_render_server) so concurrent
+# containers never contend on its SingletonLock or commit a live profile.
+cache_vol = modal.Volume.from_name("chromium-cache", create_if_missing=True)
+CHROMIUM_CACHE_DIR = "/var/chromium-cache"
+CHROMIUM_PROFILE_SEED = f"{CHROMIUM_CACHE_DIR}/profile"
+CHROMIUM_PROFILE_DIR = "/tmp/chromium-profile"
+
+# Loopback port render-server.cjs serves /dev/shm assets on (must match).
+ASSET_PORT = 8655
+
 # Create image with Node.js, bun, ffmpeg, and chromium
 image = (
     modal.Image.debian_slim(python_version="3.11")
@@ -25,6 +53,8 @@ image = (
         "libxrandr2",
         "libgbm1",
         "libasound2",
+        "libgl1-mesa-dri",
+        "libegl1",
     )
     .run_commands(
         "curl -fsSL https://deb.nodesource.com/setup_20.x | bash -",
@@ -32,141 +62,314 @@ image = (
         "curl -fsSL https://bun.sh/install | bash",
         "ln -s /root/.bun/bin/bun /usr/local/bin/bun",
     )
+    # Bake the scene font (Montserrat 800/900) into the image so text never
+    # falls back to system-ui or triggers a webfont fetch mid-render.
+    .run_commands(
+        "mkdir -p /usr/share/fonts/truetype/montserrat",
+        "curl -fsSL -o /usr/share/fonts/truetype/montserrat/Montserrat-ExtraBold.ttf"
+        " https://github.com/JulietaUla/Montserrat/raw/master/fonts/ttf/Montserrat-ExtraBold.ttf",
+        "curl -fsSL -o /usr/share/fonts/truetype/montserrat/Montserrat-Black.ttf"
+        " https://github.com/JulietaUla/Montserrat/raw/master/fonts/ttf/Montserrat-Black.ttf",
+        "fc-cache -f",
+    )
     .env({
         "PUPPETEER_SKIP_CHROMIUM_DOWNLOAD": "true",
         "PUPPETEER_EXECUTABLE_PATH": "/usr/bin/chromium",
     })
-    .pip_install("fastapi[standard]")
+    .pip_install("fastapi[standard]", "boto3", "orjson")
     .add_local_dir(
         "../video",
         remote_path="/app/video",
-        ignore=lambda path: "node_modules" in str(path) or ".git" in str(path),
+        # Pattern list instead of a per-file Python callback; *.mp4 keeps
+        # local render fixtures out of the image.
+        ignore=["**/node_modules/**", "**/.git/**", "**/dist/**", "**/*.mp4"],
         copy=True,  # required to run bun install after; files baked into image
     )
-    .run_commands("cd /app/video && bun install")
+    # Deterministic install against the committed lockfile; node_modules is
+    # baked into the image layer once instead of resolved per container.
+    # No --production: vite is a devDependency but revideo's renderer needs
+    # it at render time to serve the scene page.
+    .run_commands(
+        "cd /app/video && bun install --frozen-lockfile",
+        "chmod +x /app/video/ffmpeg-nvenc.sh",
+    )
 )
 
 
-@app.function(
+@app.cls(
     image=image,
-    timeout=900,  # 15 min - bun install + render can be slow
-    memory=16384,
-    cpu=4,
+    timeout=900,  # 15 min - renders can be slow
+    memory=4096,
+    cpu=2,
+    secrets=[aws_secret],
+    volumes={SHARED_DIR: output_vol, CHROMIUM_CACHE_DIR: cache_vol},
 )
-def render_video(
-    audio_url: str,
-    background_url: str,
-    background_type: str,
-    captions: list,
-    duration_in_seconds: float,
-    gradient_colors: list | None = None,
-    hook: str | None = None,
-    pattern_interrupts: list | None = None,
-) -> bytes:
-    """Render a video and return the MP4 bytes."""
-    print("[render] Starting video render", flush=True)
-    print(f"[render] duration={duration_in_seconds}s captions={len(captions)} pattern_interrupts={len(pattern_interrupts or [])}", flush=True)
-
-    # Create render script with progress logging (deps pre-installed in image)
-    render_script = """
-const { renderVideo } = require('@revideo/renderer');
-const fs = require('fs');
-
-const params = JSON.parse(process.argv[2]);
-
-let lastLoggedPct = -1;
-async function main() {
-    console.log('[render] Starting Revideo render...');
-    await renderVideo({
-        projectFile: '/app/video/src/project.ts',
-        variables: {
-            audioUrl: params.audioUrl,
-            backgroundUrl: params.backgroundUrl,
-            backgroundType: params.backgroundType,
-            captions: params.captions,
-            durationInSeconds: params.durationInSeconds,
-            gradientColors: params.gradientColors || ['#1a1a2e', '#16213e'],
-            hook: params.hook,
-            patternInterrupts: params.patternInterrupts || [],
-        },
-        settings: {
-            outDir: '/tmp',
-            outFile: 'output.mp4',
-            logProgress: true,
-            progressCallback: (workerId, progress) => {
-                const pct = Math.floor(progress * 10) * 10;
-                if (pct > lastLoggedPct) {
-                    lastLoggedPct = pct;
-                    console.log('[render] Progress: ' + pct + '%');
-                }
-            },
-            puppeteer: {
-                args: [
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-dev-shm-usage',
-                ],
-            },
-        },
-    });
-    console.log('[render] RENDER_COMPLETE');
-}
-
-main().catch(err => {
-    console.error('[render] ERROR:', err);
-    process.exit(1);
-});
-"""
-
-    render_script_path = "/app/video/render.js"
-    with open(render_script_path, "w") as f:
-        f.write(render_script)
-
-    params = {
-        "audioUrl": audio_url,
-        "backgroundUrl": background_url,
-        "backgroundType": background_type,
-        "captions": captions,
-        "durationInSeconds": duration_in_seconds,
-        "gradientColors": gradient_colors or ["#1a1a2e", "#16213e"],
-        "hook": hook,
-        "patternInterrupts": pattern_interrupts or [],
-    }
-
-    # Run render - stream stdout/stderr to Modal logs (no capture)
-    print("[render] Starting Node render process...", flush=True)
-    result = subprocess.run(
-        ["node", render_script_path, json.dumps(params)],
-        cwd="/app/video",
-        capture_output=False,  # stream to Modal logs in real time
-        text=True,
-    )
+class Renderer:
+    """Warm render worker.
+
+    The bun process (and with it the whole revideo require graph) starts
+    once per container and then serves every render the container handles.
+    Base resources suit gradient/image backgrounds; video backgrounds get
+    a GPU box via with_options (see _renderer_for).
+    """
+
+    def _launch_server(self):
+        # The server script ships with the video project and is baked into
+        # the image, so its mtime is stable and V8 bytecode caches hold.
+        # .cjs keeps require() working under node too - package.json says
+        # "type": "module", and only bun tolerates CJS inside ESM scope.
+        server_path = "/app/video/render-server.cjs"
+
+        # Bun starts noticeably faster than Node on the revideo require
+        # graph; RENDER_RUNTIME=node keeps the old runtime as an escape hatch.
+        runtime = os.environ.get("RENDER_RUNTIME", "bun")
+        cmd = (
+            ["bun", "run", server_path]
+            if runtime == "bun"
+            else ["node", server_path]
+        )
+        print(f"[render] Starting {runtime} render server...", flush=True)
+        self._server = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,  # stderr stays attached to Modal logs
+            cwd="/app/video",
+        )
+
+    @modal.enter()
+    def start_render_server(self):
+        # Seed the container-local profile from the shared snapshot so warm
+        # shader/V8 caches still apply on cold start.
+        import shutil
+
+        if os.path.isdir(CHROMIUM_PROFILE_SEED):
+            shutil.copytree(
+                CHROMIUM_PROFILE_SEED, CHROMIUM_PROFILE_DIR, dirs_exist_ok=True
+            )
+        self._launch_server()
+
+    @modal.exit()
+    def stop_render_server(self):
+        self._server.terminate()
+        try:
+            self._server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._server.kill()
+
+        # Publish this container's profile as the new seed now that Chromium
+        # is down - snapshotting a quiesced profile sidesteps the live-SQLite
+        # corruption risk, and last-writer-wins is fine for a cache.
+        import shutil
+
+        if os.path.isdir(CHROMIUM_PROFILE_DIR):
+            shutil.copytree(
+                CHROMIUM_PROFILE_DIR, CHROMIUM_PROFILE_SEED, dirs_exist_ok=True
+            )
+            cache_vol.commit()
+
+    @modal.method()
+    def render(
+        self,
+        audio_url: str,
+        background_url: str,
+        background_type: str,
+        captions: list,
+        duration_in_seconds: float,
+        gradient_colors: list | None = None,
+        hook: str | None = None,
+        pattern_interrupts: list | None = None,
+        log_progress: bool = True,
+        max_workers: int = 2,
+    ) -> str:
+        """Render a video and return its S3 key (or shared-volume path without AWS)."""
+        print("[render] Starting video render", flush=True)
+        print(f"[render] duration={duration_in_seconds}s captions={len(captions)} pattern_interrupts={len(pattern_interrupts or [])}", flush=True)
+
+        # Fetch remote assets once into tmpfs (/dev/shm is RAM-backed on
+        # Modal, /tmp is disk) and rewrite the URLs to the render server's
+        # loopback asset route. The scene page is http-origin (vite), so it
+        # can't load file:// subresources; localhost HTTP keeps the reads
+        # RAM-backed and the TLS/network seeks off the per-frame path.
+        import urllib.request
+
+        if audio_url.startswith("http"):
+            local_audio = "/dev/shm/audio.mp3"
+            print("[render] Downloading audio to tmpfs", flush=True)
+            urllib.request.urlretrieve(audio_url, local_audio)
+            audio_url = f"http://127.0.0.1:{ASSET_PORT}/audio.mp3"
+
+        if background_type != "gradient" and background_url.startswith("http"):
+            ext = "mp4" if background_type == "video" else "jpg"
+            local_bg = f"/dev/shm/background.{ext}"
+            print("[render] Downloading background to tmpfs", flush=True)
+            urllib.request.urlretrieve(background_url, local_bg)
+            background_url = f"http://127.0.0.1:{ASSET_PORT}/background.{ext}"
 
-    if result.returncode != 0:
-        raise Exception(f"Render process exited with code {result.returncode}")
+        # Modal injects the NVIDIA driver (incl. libnvidia-encode) into GPU
+        # containers; check for it so the same code works on CPU-only boxes.
+        has_gpu = os.path.exists("/proc/driver/nvidia")
 
-    output_path = "/tmp/output.mp4"
-    if not os.path.exists(output_path):
-        raise Exception(f"Output file not found at {output_path}")
+        params = {
+            "audioUrl": audio_url,
+            "backgroundUrl": background_url,
+            "backgroundType": background_type,
+            "captions": captions,
+            "durationInSeconds": duration_in_seconds,
+            "gradientColors": gradient_colors or ["#1a1a2e", "#16213e"],
+            "hook": hook,
+            "patternInterrupts": pattern_interrupts or [],
+            "useGpu": has_gpu,
+            "logProgress": log_progress,
+            # One renderer per ~30s of timeline, capped at one per CPU core
+            # of whichever shape dispatched us (see _renderer_for); short
+            # clips stay single-worker so they don't pay browser spins.
+            "workers": max(1, min(max_workers, int(duration_in_seconds // 30) + 1)),
+        }
+
+        # Structured progress arrives as JSON lines over a named pipe, kept
+        # separate from the human stdout log so neither side parses the
+        # other. The latest sample lands on self.last_progress for future
+        # consumers (websockets, job status) without per-line stdout parsing.
+        # The pipe is unique per request and unlinked in the finally below,
+        # so a reader orphaned by a failed render can never attach to (and
+        # steal samples from) a later render's pipe.
+        import threading
+
+        fifo_path = f"/tmp/progress-{uuid.uuid4()}.fifo"
+        os.mkfifo(fifo_path)
+        params["progressFifo"] = fifo_path
+
+        def drain_progress():
+            # open() blocks until the render server opens the write end;
+            # EOF when it closes the pipe ends the thread.
+            import json
+
+            with open(fifo_path, "r") as fifo:
+                for line in fifo:
+                    try:
+                        self.last_progress = json.loads(line)
+                    except ValueError:
+                        continue
+
+        self.last_progress = None
+        threading.Thread(target=drain_progress, daemon=True).start()
+
+        try:
+            # orjson serializes the caption list several times faster than
+            # stdlib json and emits bytes that go straight down the pipe.
+            import orjson
+
+            if self._server.poll() is not None:
+                # A crashed server must not poison the warm container for
+                # every request Modal routes here afterwards - relaunch and
+                # carry on.
+                print(
+                    f"[render] Render server died with code {self._server.returncode}; restarting",
+                    flush=True,
+                )
+                self._launch_server()
+
+            self._server.stdin.write(orjson.dumps(params) + b"\n")
+            self._server.stdin.flush()
+
+            # Echo server output into Modal logs until the completion marker.
+            for raw in self._server.stdout:
+                line = raw.decode("utf-8", errors="replace").rstrip()
+                if line == "__RENDER_DONE__":
+                    break
+                if line.startswith("__RENDER_ERROR__"):
+                    detail = line.removeprefix("__RENDER_ERROR__").strip()
+                    raise Exception(f"Render failed: {detail}")
+                print(line, flush=True)
+            else:
+                raise Exception(
+                    "Render server exited before completing the render"
+                )
+        finally:
+            # If the render died before the server ever opened the pipe, the
+            # reader thread is still blocked in open(); a transient write end
+            # hands it EOF so it exits instead of lingering. Then drop the
+            # pipe itself.
+            try:
+                fd = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+                os.close(fd)
+            except OSError:
+                pass
+            os.unlink(fifo_path)
+
+        # Matches outDir in render-server.cjs: the MP4 is produced and consumed
+        # entirely in RAM.
+        output_path = "/dev/shm/output.mp4"
+        if not os.path.exists(output_path):
+            raise Exception(f"Output file not found at {output_path}")
+
+        size = os.path.getsize(output_path)
+        print(f"[render] Done. Output size: {size} bytes", flush=True)
+
+        if "AWS_ACCESS_KEY_ID" not in os.environ:
+            # No S3 configured: park the MP4 on the shared volume so the
+            # endpoint can stream it out without holding the bytes in Python.
+            import shutil
 
-    size = os.path.getsize(output_path)
-    print(f"[render] Done. Output size: {size} bytes", flush=True)
+            shared_path = f"{SHARED_DIR}/{uuid.uuid4()}.mp4"
+            shutil.move(output_path, shared_path)
+            output_vol.commit()
+            print(f"[render] Moved to {shared_path}", flush=True)
+            return shared_path
 
-    with open(output_path, "rb") as f:
-        return f.read()
+        # Hand boto3 the open file object so parts are read on demand into
+        # fixed-size transfer buffers - the MP4 never exists as one Python
+        # bytes object. 8MB parts on 8 threads keep reads overlapped with
+        # upload bandwidth for the whole transfer.
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        key = f"render-outputs/{uuid.uuid4()}/output.mp4"
+        s3 = boto3.client("s3", region_name=AWS_REGION)
+        with open(output_path, "rb") as f:
+            s3.upload_fileobj(
+                f,
+                ASSETS_BUCKET,
+                key,
+                Config=TransferConfig(
+                    multipart_threshold=8 * 1024 * 1024,
+                    multipart_chunksize=8 * 1024 * 1024,
+                    max_concurrency=8,
+                    use_threads=True,
+                ),
+            )
+        print(f"[render] Uploaded to s3://{ASSETS_BUCKET}/{key}", flush=True)
+
+        return key
+
+
+def _renderer_for(background_type: str) -> tuple["Renderer", int]:
+    """Video backgrounds need decode bandwidth and the NVENC GPU; everything
+    else renders fine on the light base box and packs onto workers faster.
+
+    Returns the renderer together with its worker cap (one per CPU core of
+    the chosen shape) - render() can't see which shape it landed on, so the
+    dispatch site passes it through.
+    """
+    if background_type == "video":
+        return Renderer.with_options(gpu="T4", cpu=4, memory=16384)(), 4
+    return Renderer(), 2
 
 
 @app.function(
     image=image,
     timeout=900,
-    memory=16384,
-    cpu=4,
+    memory=1024,
+    cpu=1,
+    secrets=[aws_secret],
+    volumes={SHARED_DIR: output_vol},
 )
 @modal.fastapi_endpoint(method="POST")
-def render_video_endpoint(data: dict) -> dict:
+def render_video_endpoint(data: dict):
     """HTTP endpoint for rendering videos."""
     try:
-        video_bytes = render_video.local(
+        renderer, max_workers = _renderer_for(data["backgroundType"])
+        key = renderer.render.remote(
             audio_url=data["audioUrl"],
             background_url=data["backgroundUrl"],
             background_type=data["backgroundType"],
@@ -175,14 +378,64 @@ def render_video_endpoint(data: dict) -> dict:
             gradient_colors=data.get("gradientColors"),
             hook=data.get("hook"),
             pattern_interrupts=data.get("patternInterrupts"),
+            # Nobody reads per-frame progress on the API path; humans running
+            # the module directly still get it.
+            log_progress=False,
+            max_workers=max_workers,
         )
 
-        # Return base64 encoded video or upload to S3
-        import base64
+        if key.startswith(SHARED_DIR):
+            # Volume path: stream chunks straight off the file so the MP4
+            # never materializes in the endpoint's memory.
+            from fastapi.responses import FileResponse
+            from starlette.background import BackgroundTask
+
+            output_vol.reload()
+
+            def cleanup(path: str = key) -> None:
+                # Runs after the response is sent: drop the streamed file,
+                # plus anything a failed/abandoned request orphaned more than
+                # a day ago, so the volume doesn't grow without bound.
+                import time
+
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                cutoff = time.time() - 24 * 3600
+                for name in os.listdir(SHARED_DIR):
+                    stale = os.path.join(SHARED_DIR, name)
+                    try:
+                        if os.path.getmtime(stale) < cutoff:
+                            os.remove(stale)
+                    except OSError:
+                        continue
+                output_vol.commit()
+
+            return FileResponse(
+                key,
+                media_type="video/mp4",
+                headers={
+                    "Cache-Control": "no-store",
+                    "Content-Disposition": 'attachment; filename="output.mp4"',
+                },
+                background=BackgroundTask(cleanup),
+            )
+
+        # Presigned URL keeps the response a few hundred bytes instead of
+        # tens of MB of base64 through the JSON serializer.
+        import boto3
+
+        s3 = boto3.client("s3", region_name=AWS_REGION)
+        video_url = s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": ASSETS_BUCKET, "Key": key},
+            ExpiresIn=PRESIGNED_URL_EXPIRY_SECONDS,
+        )
         return {
             "success": True,
-            "videoBase64": base64.b64encode(video_bytes).decode("utf-8"),
-            "size": len(video_bytes),
+            "videoUrl": video_url,
+            "key": key,
         }
     except Exception as e:
         return {
@@ -195,7 +448,7 @@ def render_video_endpoint(data: dict) -> dict:
 if __name__ == "__main__":
     with app.run():
         # Use real audio URL and sample captions for testing
-        result = render_video.remote(
+        result = Renderer().render.remote(
             audio_url="https://unscroll-assets.s3.us-east-2.amazonaws.com/render-assets/19a1ec6e-f8cb-4f48-b028-d98e6537ad73/audio.mp3",
             background_url="",
             background_type="gradient",
@@ -209,4 +462,4 @@ if __name__ == "__main__":
             ],
             duration_in_seconds=5,
         )
-        print(f"Rendered {len(result)} bytes")
+        print(f"Rendered to s3://{ASSETS_BUCKET}/{result}")
@@ -0,0 +1,15 @@
+#!/bin/bash
+# ffmpeg shim for GPU render containers, installed via revideo's ffmpegPath
+# setting - the only encoder hook RenderSettings expose at @revideo 0.5.x
+# (unknown settings keys are silently dropped). Rewrites the exporter's
+# libx264 selection to NVENC with tuned rate control; invocations without a
+# libx264 arg (audio merge, concat) pass through untouched.
+args=()
+for arg in "$@"; do
+    if [ "$arg" = "libx264" ]; then
+        args+=(h264_nvenc -preset p4 -tune hq -rc vbr -cq 23 -b:v 0)
+    else
+        args+=("$arg")
+    fi
+done
+exec ffmpeg "${args[@]}"
@@ -0,0 +1,189 @@
+// Long-running render server driven by modal/render_video.py: one JSON
+// request per stdin line, renders run sequentially, and completion is
+// signalled with marker lines on stdout. Living in a file (rather than being
+// written by Python per container) keeps the mtime stable so V8/bun can
+// reuse cached bytecode across warm invocations.
+const { renderVideo } = require('@revideo/renderer');
+const fs = require('fs');
+const http = require('http');
+const path = require('path');
+const readline = require('readline');
+
+// Serves the tmpfs assets render_video.py pre-downloads to /dev/shm. The
+// scene page is http-origin (vite on localhost), so Chromium refuses file://
+// subresources - a loopback HTTP server keeps the reads RAM-backed while
+// staying a legal origin. Range support matters: media elements seek.
+const ASSET_DIR = '/dev/shm';
+const ASSET_PORT = 8655;
+const ASSET_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.mp4': 'video/mp4',
+    '.jpg': 'image/jpeg',
+};
+
+const assetServer = http.createServer((req, res) => {
+    const urlPath = decodeURIComponent((req.url || '/').split('?')[0]);
+    const filePath = path.join(ASSET_DIR, path.normalize(urlPath));
+    if (!filePath.startsWith(ASSET_DIR + '/') || !fs.existsSync(filePath)) {
+        res.writeHead(404);
+        res.end();
+        return;
+    }
+    const size = fs.statSync(filePath).size;
+    const type = ASSET_TYPES[path.extname(filePath)] || 'application/octet-stream';
+    const range = /^bytes=(\d*)-(\d*)$/.exec(req.headers.range || '');
+    if (range) {
+        const start = range[1] ? parseInt(range[1], 10) : 0;
+        const end = range[2] ? parseInt(range[2], 10) : size - 1;
+        res.writeHead(206, {
+            'Content-Type': type,
+            'Accept-Ranges': 'bytes',
+            'Content-Range': 'bytes ' + start + '-' + end + '/' + size,
+            'Content-Length': end - start + 1,
+        });
+        fs.createReadStream(filePath, { start, end }).pipe(res);
+    } else {
+        res.writeHead(200, {
+            'Content-Type': type,
+            'Accept-Ranges': 'bytes',
+            'Content-Length': size,
+        });
+        fs.createReadStream(filePath).pipe(res);
+    }
+});
+assetServer.on('error', (err) => {
+    console.error('[render] asset server error: ' + err.message);
+});
+assetServer.listen(ASSET_PORT, '127.0.0.1');
+
+async function handleRequest(line) {
+    let lastLoggedPct = -1;
+    let lastLogTime = 0;
+    let prog = null;
+    try {
+        // Parse inside the try: a malformed request must fail that request,
+        // not reject the queue chain and wedge the server.
+        const params = JSON.parse(line);
+        // Machine-readable progress goes down a named pipe as JSON lines;
+        // stdout stays the human log and never needs re-parsing.
+        if (params.progressFifo) {
+            prog = fs.createWriteStream(params.progressFifo);
+            // A vanished reader (EPIPE) must not take the server down.
+            prog.on('error', (err) => {
+                console.error('[render] progress pipe error: ' + err.message);
+                prog = null;
+            });
+        }
+        console.log('[render] Starting Revideo render...');
+        await renderVideo({
+            projectFile: '/app/video/src/project.ts',
+            variables: {
+                audioUrl: params.audioUrl,
+                backgroundUrl: params.backgroundUrl,
+                backgroundType: params.backgroundType,
+                captions: params.captions,
+                durationInSeconds: params.durationInSeconds,
+                gradientColors: params.gradientColors || ['#1a1a2e', '#16213e'],
+                hook: params.hook,
+                patternInterrupts: params.patternInterrupts || [],
+            },
+            settings: {
+                // /dev/shm is RAM-backed on Modal (/tmp is disk), so encoder
+                // output and the final mux never pay disk write bandwidth.
+                outDir: '/dev/shm',
+                outFile: 'output.mp4',
+                // Shard the timeline across parallel renderers; revideo
+                // stitches the partial MP4s back together with ffmpeg concat.
+                workers: params.workers || 1,
+                logProgress: params.logProgress !== false,
+                // revideo fires this every frame; gate it to 5% steps and at
+                // most twice a second so 1800 frames don't become 1800 string
+                // concats on the event loop.
+                progressCallback: (workerId, progress) => {
+                    if (prog) {
+                        prog.write(JSON.stringify({ worker: workerId, progress }) + '\n');
+                    }
+                    if (params.logProgress === false) return;
+                    const pct = Math.floor(progress * 100);
+                    const now = Date.now();
+                    if (pct !== lastLoggedPct && pct % 5 === 0 && now - lastLogTime > 500) {
+                        lastLoggedPct = pct;
+                        lastLogTime = now;
+                        console.log('[render] Progress: ' + pct + '%');
+                    }
+                },
+                puppeteer: {
+                    args: [
+                        '--no-sandbox',
+                        '--disable-setuid-sandbox',
+                        '--disable-dev-shm-usage',
+                        // Keep Chromium's main thread off the network: no
+                        // update checks, sync, metrics uploads or default-app
+                        // fetches competing with frame rendering.
+                        '--disable-background-networking',
+                        '--disable-component-update',
+                        '--disable-default-apps',
+                        '--disable-sync',
+                        '--metrics-recording-only',
+                        '--no-first-run',
+                        // Container-local profile, seeded from (and published
+                        // back to) the cache volume by render_video.py, so
+                        // warm GLSL/V8 caches apply without two containers
+                        // ever sharing a live profile. Only one Chromium can
+                        // hold the profile lock, so sharded renders fall back
+                        // to an ephemeral profile.
+                        ...((params.workers || 1) === 1 ? [
+                            '--user-data-dir=/tmp/chromium-profile',
+                            '--disk-cache-dir=/tmp/chromium-profile/disk',
+                            '--disk-cache-size=1073741824',
+                        ] : []),
+                        // With a GPU, force hardware rasterization instead of
+                        // letting Chromium fall back to software paths;
+                        // without one, pin SwiftShader up front so GL init
+                        // never stalls probing for a driver that is not there.
+                        ...(params.useGpu ? [
+                            '--use-gl=egl',
+                            '--enable-gpu-rasterization',
+                            '--enable-zero-copy',
+                            '--ignore-gpu-blocklist',
+                            '--enable-features=VaapiVideoDecoder',
+                        ] : [
+                            '--use-gl=angle',
+                            '--use-angle=swiftshader',
+                        ]),
+                    ],
+                },
+                // NVENC runs on a dedicated ASIC, so 1080p encode jumps from
+                // tens of fps (libx264) to hundreds while the CPU cores stay
+                // free for Puppeteer. RenderSettings at 0.5.x only honor
+                // ffmpegLogLevel/ffmpegPath here (unknown keys are dropped),
+                // so the encoder switch lives in a wrapper that rewrites the
+                // exporter's libx264 argv to h264_nvenc.
+                ffmpeg: params.useGpu
+                    ? { ffmpegPath: '/app/video/ffmpeg-nvenc.sh' }
+                    : undefined,
+            },
+        });
+        console.log('[render] RENDER_COMPLETE');
+        console.log('__RENDER_DONE__');
+    } catch (err) {
+        const msg = String((err && err.stack) || err).replace(/\n/g, ' | ');
+        console.log('__RENDER_ERROR__ ' + msg);
+    } finally {
+        // EOF on the pipe tells the Python reader thread this render is over.
+        if (prog) prog.end();
+    }
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+let queue = Promise.resolve();
+rl.on('line', (line) => {
+    if (!line.trim()) return;
+    // handleRequest catches its own errors; this backstop keeps any escaped
+    // rejection from stopping the chain (and, as an unhandled rejection,
+    // killing the process) for every request after it.
+    queue = queue.then(() => handleRequest(line)).catch((err) => {
+        const msg = String((err && err.stack) || err).replace(/\n/g, ' | ');
+        console.log('__RENDER_ERROR__ ' + msg);
+    });
+});